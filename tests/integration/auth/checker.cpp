@@ -9,11 +9,19 @@
 // by the Apache License, Version 2.0, included in the file
 // licenses/APL.txt.
 
+#include <iostream>
+#include <string>
+#include <vector>
+
+#include <fmt/core.h>
 #include <gflags/gflags.h>
 
+#include <json/json.hpp>
+
 #include "communication/bolt/client.hpp"
 #include "io/network/endpoint.hpp"
 #include "io/network/utils.hpp"
+#include "utils/logging.hpp"
 
 DEFINE_string(address, "127.0.0.1", "Server address");
 DEFINE_int32(port, 7687, "Server port");
@@ -21,18 +29,20 @@ DEFINE_string(username, "admin", "Username for the database");
 DEFINE_string(password, "admin", "Password for the database");
 DEFINE_bool(use_ssl, false, "Set to true to connect with SSL to the server.");
 
-/**
- * Verifies that user 'user' has privileges that are given as positional
- * arguments.
- */
-int main(int argc, char **argv) {
-  gflags::ParseCommandLineFlags(&argc, &argv, true);
+DEFINE_bool(server, false,
+            "Set to true to keep reading expected privileges (a JSON list per line) from stdin and writing the check "
+            "results (one per line) to stdout instead of checking the positional arguments.");
 
-  memgraph::communication::SSLInit sslInit;
+namespace {
 
+/**
+ * Verifies that user 'user' has the expected privileges. Returns a description
+ * of the first mismatch or an empty string if the privileges match.
+ */
+std::string CheckPrivileges(memgraph::communication::ClientContext &context,
+                            const std::vector<std::string> &expected_values) {
   memgraph::io::network::Endpoint endpoint(memgraph::io::network::ResolveHostname(FLAGS_address), FLAGS_port);
 
-  memgraph::communication::ClientContext context(FLAGS_use_ssl);
   memgraph::communication::bolt::Client client(context);
 
   client.Connect(endpoint, FLAGS_username, FLAGS_password);
@@ -44,24 +54,61 @@ int main(int argc, char **argv) {
     for (const auto &record : records) {
       count_got += record.size();
     }
-    if (count_got != argc - 1) {
-      LOG_FATAL("Expected the grants to have {} entries but they had {} entries!", argc - 1, count_got);
+    if (count_got != expected_values.size()) {
+      return fmt::format("Expected the grants to have {} entries but they had {} entries!", expected_values.size(),
+                         count_got);
     }
-    uint64_t pos = 1;
+    uint64_t pos = 0;
     for (const auto &record : records) {
       for (const auto &value : record) {
-        std::string expected(argv[pos++]);
+        const auto &expected = expected_values[pos++];
         if (value.ValueString() != expected) {
-          LOG_FATAL("Expected to get the value '{} but got the value '{}'", expected, value.ValueString());
+          return fmt::format("Expected to get the value '{} but got the value '{}'", expected, value.ValueString());
         }
       }
     }
   } catch (const memgraph::communication::bolt::ClientQueryException &e) {
-    LOG_FATAL(
+    return fmt::format(
         "The query shoudn't have failed but it failed with an "
         "error message '{}'",
         e.what());
   }
 
+  return "";
+}
+
+}  // namespace
+
+/**
+ * Verifies that user 'user' has privileges that are given as positional
+ * arguments. In server mode, keeps checking the privileges read from stdin
+ * until it is closed and answers each check with a line containing
+ * `{"error": "<description of the mismatch>"}`.
+ */
+int main(int argc, char **argv) {
+  gflags::ParseCommandLineFlags(&argc, &argv, true);
+
+  memgraph::communication::SSLInit sslInit;
+
+  memgraph::communication::ClientContext context(FLAGS_use_ssl);
+
+  if (!FLAGS_server) {
+    const auto error = CheckPrivileges(context, std::vector<std::string>(argv + 1, argv + argc));
+    if (!error.empty()) {
+      LOG_FATAL("{}", error);
+    }
+    return 0;
+  }
+
+  // stdout is used for the results
+  memgraph::logging::RedirectToStderr();
+
+  std::string line;
+  while (std::getline(std::cin, line)) {
+    const auto expected_values = nlohmann::json::parse(line).get<std::vector<std::string>>();
+    const nlohmann::json result = {{"error", CheckPrivileges(context, expected_values)}};
+    std::cout << result.dump() << std::endl;
+  }
+
   return 0;
 }
@@ -1,4 +1,4 @@
-#!/usr/bin/python3 -u
+#!/usr/bin/python3
 
 # Copyright 2021 Memgraph Ltd.
 #
@@ -13,19 +13,26 @@
 
 import argparse
 import atexit
+import collections
+import concurrent.futures
+import functools
+import json
 import os
+import socket
 import subprocess
 import sys
 import tempfile
+import threading
 import time
+import types
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 PROJECT_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, "..", "..", ".."))
 
 # When you create a new permission just add a testcase to this list (a tuple
 # of query, touple of required permissions) and the test will automatically
-# detect the new permission (from the query required permissions) and test all
-# queries against all combinations of permissions.
+# detect the new permission (from the query required permissions) and test each
+# query with exactly its required permissions and with each of them missing.
 
 QUERIES = [
     # CREATE
@@ -76,272 +83,565 @@ QUERIES = [
     ("SHOW USERS FOR test_role", ("AUTH",)),
 ]
 
+# All existing permissions, the bit of each of them in the masks of user
+# permissions and the number of all such masks
+PERMISSIONS = tuple(sorted({sys.intern(perm) for _, perms in QUERIES for perm in perms}))
+PERM_BIT = {perm: 1 << pos for pos, perm in enumerate(PERMISSIONS)}
+NUM_MASKS = 1 << len(PERMISSIONS)
+
+# Queries along with the mask of the permissions they require, so checking
+# whether a query is authorized is a single integer operation
+QueryRec = collections.namedtuple("QueryRec", ["query", "qmask", "perms"])
+
+QUERIES_PARSED = [
+    QueryRec(query, sum(PERM_BIT[perm] for perm in perms), tuple(sys.intern(perm) for perm in perms))
+    for query, perms in QUERIES
+]
+
+
+def get_expected_privileges(user_perm, role_perm, mapped):
+    expected = []
+    perms = [user_perm, role_perm] if mapped else [user_perm]
+    if "DENY" in perms:
+        expected = ["MATCH", "DENY"]
+    elif "GRANT" in perms:
+        expected = ["MATCH", "GRANT"]
+    if len(expected) > 0:
+        details = []
+        if user_perm == "GRANT":
+            details.append("GRANTED TO USER")
+        elif user_perm == "DENY":
+            details.append("DENIED TO USER")
+        if mapped:
+            if role_perm == "GRANT":
+                details.append("GRANTED TO ROLE")
+            elif role_perm == "DENY":
+                details.append("DENIED TO ROLE")
+        expected.append(", ".join(details))
+    return expected
+
+
+# Expected privileges of the user in the user/role permissions test for each
+# (MATCH privilege of the user, MATCH privilege of the role, user mapped to
+# the role) combination
+EXPECTED_TABLE = {
+    (user_perm, role_perm, mapped): get_expected_privileges(user_perm, role_perm, mapped)
+    for user_perm in ["GRANT", "DENY", "REVOKE"]
+    for role_perm in ["GRANT", "DENY", "REVOKE"]
+    for mapped in [True, False]
+}
+
+# Memgraph instances listen only on the loopback interface, each one of them on
+# its own Bolt, monitoring and metrics ports
+LISTEN_ADDRESS = "127.0.0.1"
+NUM_PORTS_PER_INSTANCE = 3
+
+# Status lines are buffered and written out in batches of this many lines
+LOG_FLUSH_LINES = 64
+
 UNAUTHORIZED_ERROR = r"^You are not authorized to execute this query.*?Please contact your database administrator\."
 
+# Expected outcomes of a query executed by the tester, see `tester.cpp`.
+EXPECT_SUCCESS = "success"
+EXPECT_FAILURE = "failure"
+EXPECT_UNCHECKED = "unchecked"
+
+
+log_lines = []
+log_lock = threading.RLock()
+
+
+def log(*args, flush=False):
+    # Section banners are flushed right away, so a hanging test still shows
+    # which section it is stuck in
+    with log_lock:
+        log_lines.append(" ".join(map(str, args)))
+        if flush or len(log_lines) >= LOG_FLUSH_LINES:
+            flush_log()
+
+
+def flush_log():
+    with log_lock:
+        sys.stdout.write("".join(line + "\n" for line in log_lines))
+        sys.stdout.flush()
+        log_lines.clear()
+
+
+def spawn(args, **kwargs):
+    # Without closing file descriptors (all of ours are non-inheritable anyway)
+    # CPython starts the process with posix_spawn instead of fork and exec
+    return subprocess.Popen(args, close_fds=False, **kwargs)
+
+
+def get_free_ports(count):
+    # All sockets are kept open until every port is chosen, so the OS doesn't
+    # hand out the same port twice
+    sockets = [socket.socket() for _ in range(count)]
+    try:
+        for sock in sockets:
+            sock.bind((LISTEN_ADDRESS, 0))
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def start_server(binary, port):
+    # Errors are reported through the results read from stdout, so the output
+    # on stderr is only kept around in case the server dies
+    stderr_file = tempfile.TemporaryFile(mode="w+")
+    server = spawn(
+        [binary, "--server", "--address", LISTEN_ADDRESS, "--port", str(port)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=stderr_file,
+        text=True,
+    )
+    server.stderr_file = stderr_file
+
+    # Register cleanup function
+    @atexit.register
+    def cleanup():
+        stop_server(server)
+
+    return server
+
+
+def stop_server(server):
+    try:
+        server.stdin.close()
+    except BrokenPipeError:
+        # The server already died
+        pass
+    return server.wait()
+
+
+def get_server_log(server):
+    server.stderr_file.seek(0)
+    return server.stderr_file.read()
+
+
+def send_request(server, request, check=True):
+    try:
+        server.stdin.write(json.dumps(request) + "\n")
+        server.stdin.flush()
+    except BrokenPipeError:
+        # The server died, which is reported below
+        pass
+    response = server.stdout.readline()
+    assert response, "{} process died prematurely!\n{}".format(server.args[0], get_server_log(server))
+    error = json.loads(response)["error"]
+    assert not check or not error, error
+    return error
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_header(username, password, failure_message="", connection_should_fail=False):
+    # Everything but the queries is the same for all batches of a user, so it
+    # is built only once; it is shared between all callers, so it is read-only
+    return types.MappingProxyType(
+        {
+            "username": username,
+            "password": password,
+            "failure_message": failure_message,
+            "connection_should_fail": connection_should_fail,
+        }
+    )
+
+
+def send_batch(tester, header, queries, check=True):
+    request = dict(header, queries=[{"query": query, "expect": expect} for query, expect in queries])
+    return send_request(tester, request, check)
+
 
-def wait_for_server(port, delay=0.1):
-    cmd = ["nc", "-z", "-w", "1", "127.0.0.1", str(port)]
-    while subprocess.call(cmd) != 0:
+def wait_for_server(memgraph, tester):
+    # A batch without queries only connects to the server, so it succeeds as
+    # soon as the server completes the Bolt handshake
+    while send_batch(tester, get_batch_header("", ""), [], check=False):
+        assert memgraph.poll() is None, "Memgraph process died prematurely!"
         time.sleep(0.01)
-    time.sleep(delay)
-
-
-def execute_tester(
-    binary,
-    queries,
-    should_fail=False,
-    failure_message="",
-    username="",
-    password="",
-    check_failure=True,
-    connection_should_fail=False,
-):
-    args = [binary, "--username", username, "--password", password]
-    if should_fail:
-        args.append("--should-fail")
-    if failure_message:
-        args.extend(["--failure-message", failure_message])
-    if check_failure:
-        args.append("--check-failure")
-    if connection_should_fail:
-        args.append("--connection-should-fail")
-    args.extend(queries)
-    subprocess.run(args).check_returncode()
-
-
-def execute_checker(binary, grants):
-    args = [binary] + grants
-    subprocess.run(args).check_returncode()
+
+
+def execute_checker(checker, grants):
+    send_request(checker, grants)
 
 
 def get_permissions(permissions, mask):
-    ret, pos = [], 0
-    while mask > 0:
-        if mask & 1:
-            ret.append(permissions[pos])
-        mask >>= 1
-        pos += 1
+    ret = []
+    while mask:
+        lsb = mask & -mask
+        ret.append(permissions[lsb.bit_length() - 1])
+        mask ^= lsb
     return ret
 
 
-def check_permissions(query_perms, user_perms):
-    return set(query_perms).issubset(user_perms)
+def get_gray_rank(mask):
+    # Position of the mask in the (binary reflected) Gray code, in which
+    # consecutive masks differ in a single permission
+    rank = mask
+    while mask:
+        mask >>= 1
+        rank ^= mask
+    return rank
+
+
+def get_group_steps():
+    # A query is authorized only with respect to its own permissions, so the
+    # queries requiring the same permissions are checked together, once with
+    # exactly those permissions and once with each one of them missing. The
+    # groups are ordered by the Gray code of their masks, so consecutive
+    # groups differ in as few permissions as possible.
+    groups = collections.defaultdict(list)
+    for rec in QUERIES_PARSED:
+        groups[rec.qmask].append(rec.query)
+    steps = []
+    for qmask in sorted(groups, key=get_gray_rank):
+        steps.append((qmask, tuple((query, EXPECT_UNCHECKED) for query in groups[qmask])))
+        bits = qmask
+        while bits:
+            bit = bits & -bits
+            steps.append((qmask ^ bit, tuple((query, EXPECT_FAILURE) for query in groups[qmask])))
+            bits ^= bit
+    return steps
+
+
+def get_pairwise_masks():
+    # Greedily picks masks until each pair of permissions was seen in all four
+    # combinations of being granted or not (pairwise coverage)
+    def pair(a, value_a, b, value_b):
+        return (a, b, value_a, value_b) if a < b else (b, a, value_b, value_a)
+
+    num_bits = len(PERMISSIONS)
+    if num_bits < 2:
+        return list(range(NUM_MASKS))
+    uncovered = set()
+    for a in range(num_bits):
+        for b in range(a + 1, num_bits):
+            for value_a in (0, 1):
+                for value_b in (0, 1):
+                    uncovered.add((a, b, value_a, value_b))
+    masks = []
+    while uncovered:
+        a, b, value_a, value_b = min(uncovered)
+        values = {a: value_a, b: value_b}
+        for bit in range(num_bits):
+            if bit in values:
+                continue
+            gains = [sum(pair(bit, value, other, values[other]) in uncovered for other in values) for value in (0, 1)]
+            values[bit] = 1 if gains[1] > gains[0] else 0
+        mask = sum(value << bit for bit, value in values.items())
+        for a in range(num_bits):
+            for b in range(a + 1, num_bits):
+                uncovered.discard((a, b, (mask >> a) & 1, (mask >> b) & 1))
+        masks.append(mask)
+    return masks
+
+
+def get_mask_steps(masks):
+    # All queries are checked with each mask, the masks are ordered by their
+    # Gray code, so consecutive masks differ in as few permissions as possible
+    steps = []
+    for mask in sorted(masks, key=get_gray_rank):
+        queries = []
+        for rec in QUERIES_PARSED:
+            queries.append((rec.query, EXPECT_UNCHECKED if (rec.qmask & mask) == rec.qmask else EXPECT_FAILURE))
+        steps.append((mask, tuple(queries)))
+    return steps
+
+
+def get_test_steps(coverage):
+    # Returns a list of (mask of user permissions, queries with their expected
+    # outcomes) checked by the query tests
+    if coverage == "groups":
+        return get_group_steps()
+    if coverage == "pairwise":
+        return get_mask_steps(get_pairwise_masks())
+    if coverage == "exhaustive":
+        return get_mask_steps(range(NUM_MASKS))
+    raise ValueError("Unknown coverage '{}'".format(coverage))
+
+
+def execute_test(memgraph_binary, tester_binary, checker_binary, num_workers, coverage):
+    test_steps = get_test_steps(coverage)
+
+    # Each worker gets its own memgraph instance (and tester), the first one is
+    # also used for all tests that aren't split between the workers
+    num_workers = max(1, min(num_workers, len(test_steps)))
+    ports = get_free_ports(num_workers * NUM_PORTS_PER_INSTANCE)
+    bolt_ports, monitoring_ports, metrics_ports = (
+        ports[i::NUM_PORTS_PER_INSTANCE] for i in range(NUM_PORTS_PER_INSTANCE)
+    )
 
+    # (username, mask) whose privileges were the last ones set on each worker,
+    # reset whenever any other admin query is executed on that worker
+    granted_masks = [None] * num_workers
 
-def execute_test(memgraph_binary, tester_binary, checker_binary):
-    storage_directory = tempfile.TemporaryDirectory()
-    memgraph_args = [memgraph_binary, "--data-directory", storage_directory.name]
+    admin_header = get_batch_header("admin", "admin")
 
-    def execute_admin_queries(queries):
-        return execute_tester(
-            tester_binary, queries, should_fail=False, check_failure=True, username="admin", password="admin"
-        )
+    def execute_admin_queries(queries, worker=0):
+        granted_masks[worker] = None
+        return send_batch(testers[worker], admin_header, [(query, EXPECT_SUCCESS) for query in queries])
 
     def execute_user_queries(
         queries,
-        should_fail=False,
-        failure_message="",
-        check_failure=True,
+        failure_message=UNAUTHORIZED_ERROR,
         username="user",
         connection_should_fail=False,
+        worker=0,
     ):
-        return execute_tester(
-            tester_binary,
-            queries,
-            should_fail,
-            failure_message,
-            username,
-            "user",
-            check_failure,
-            connection_should_fail,
-        )
-
-    # Start the memgraph binary
-    memgraph = subprocess.Popen(list(map(str, memgraph_args)))
-    time.sleep(0.1)
-    assert memgraph.poll() is None, "Memgraph process died prematurely!"
-    wait_for_server(7687)
+        header = get_batch_header(username, "user", failure_message, connection_should_fail)
+        return send_batch(testers[worker], header, queries)
+
+    # (username, granted mask, mask) -> (privileges, admin queries granting
+    # them), the granted mask is None if the current privileges are unknown
+    grant_cache = {}
+
+    def get_grant(username, granted, mask):
+        key = (username, granted, mask)
+        if key not in grant_cache:
+            # Only the difference to the already granted privileges is applied
+            admin_queries = []
+            if granted is None:
+                admin_queries.append("REVOKE ALL PRIVILEGES FROM {}".format(username.upper()))
+                granted = 0
+            if mask & ~granted:
+                added = ", ".join(get_permissions(PERMISSIONS, mask & ~granted))
+                admin_queries.append("GRANT {} TO {}".format(added, username.capitalize()))
+            if granted & ~mask:
+                removed = ", ".join(get_permissions(PERMISSIONS, granted & ~mask))
+                admin_queries.append("REVOKE {} FROM {}".format(removed, username.capitalize()))
+            grant_cache[key] = (", ".join(get_permissions(PERMISSIONS, mask)), admin_queries)
+        return grant_cache[key]
+
+    def execute_step_queries(username, steps, worker):
+        for mask, queries in steps:
+            granted = None
+            if granted_masks[worker] is not None and granted_masks[worker][0] == username:
+                granted = granted_masks[worker][1]
+            privileges, admin_queries = get_grant(username, granted, mask)
+            log("\033[1;34m~~ Checking queries with privileges: ", privileges, " ~~\033[0m")
+            if admin_queries:
+                execute_admin_queries(admin_queries, worker=worker)
+            granted_masks[worker] = (username, mask)
+            execute_user_queries(queries, username=username, worker=worker)
+
+    def execute_steps(username, steps):
+        # The privileges of each step are set regardless of the previous ones,
+        # so the steps are independent of each other and can be split between
+        # the workers. Each worker gets a contiguous range of them, so its
+        # consecutive steps differ in as few privileges as possible.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(
+                    execute_step_queries,
+                    username,
+                    steps[len(steps) * worker // num_workers : len(steps) * (worker + 1) // num_workers],
+                    worker,
+                )
+                for worker in range(num_workers)
+            ]
+            for future in futures:
+                future.result()
+
+    # Start the memgraph binaries
+    storage_directories = [tempfile.TemporaryDirectory() for _ in range(num_workers)]
+    memgraphs = []
+    for bolt_port, monitoring_port, metrics_port, storage_directory in zip(
+        bolt_ports, monitoring_ports, metrics_ports, storage_directories
+    ):
+        memgraph_args = [
+            memgraph_binary,
+            "--data-directory",
+            storage_directory.name,
+            "--bolt-address",
+            LISTEN_ADDRESS,
+            "--bolt-port",
+            bolt_port,
+            "--monitoring-address",
+            LISTEN_ADDRESS,
+            "--monitoring-port",
+            monitoring_port,
+            "--metrics-address",
+            LISTEN_ADDRESS,
+            "--metrics-port",
+            metrics_port,
+        ]
+        memgraphs.append(spawn(list(map(str, memgraph_args))))
 
     # Register cleanup function
     @atexit.register
     def cleanup():
-        if memgraph.poll() is None:
-            memgraph.terminate()
-        assert memgraph.wait() == 0, "Memgraph process didn't exit cleanly!"
+        for memgraph in memgraphs:
+            if memgraph.poll() is None:
+                memgraph.terminate()
+        for memgraph in memgraphs:
+            assert memgraph.wait() == 0, "Memgraph process didn't exit cleanly!"
+
+    # Start the tester and checker servers
+    testers = [start_server(tester_binary, port) for port in bolt_ports]
+    checker = start_server(checker_binary, bolt_ports[0])
+
+    for memgraph, tester in zip(memgraphs, testers):
+        wait_for_server(memgraph, tester)
+
+    for worker in range(num_workers):
+        # Prepare the multi database environment
+        execute_admin_queries(
+            [
+                "CREATE DATABASE db1",
+                "CREATE DATABASE db2",
+            ],
+            worker=worker,
+        )
 
-    # Prepare the multi database environment
-    execute_admin_queries(
-        [
-            "CREATE DATABASE db1",
-            "CREATE DATABASE db2",
-        ]
-    )
+        # Prepare all users
+        execute_admin_queries(
+            [
+                "CREATE USER ADmin IDENTIFIED BY 'admin'",
+                "GRANT ALL PRIVILEGES TO admIN",
+                "GRANT DATABASE * TO admin",
+                "CREATE USER usEr IDENTIFIED BY 'user'",
+                "GRANT DATABASE db1 TO user",
+                "GRANT DATABASE db2 TO user",
+                "CREATE USER useR2 IDENTIFIED BY 'user'",
+                "GRANT DATABASE db2 TO user2",
+                "REVOKE DATABASE memgraph FROM user2",
+                "SET MAIN DATABASE db2 FOR user2",
+                "CREATE USER user3 IDENTIFIED BY 'user'",
+                "GRANT ALL PRIVILEGES TO user3",
+                "GRANT DATABASE * TO user3",
+                "REVOKE DATABASE memgraph FROM user3",
+            ],
+            worker=worker,
+        )
 
-    # Prepare all users
-    execute_admin_queries(
-        [
-            "CREATE USER ADmin IDENTIFIED BY 'admin'",
-            "GRANT ALL PRIVILEGES TO admIN",
-            "GRANT DATABASE * TO admin",
-            "CREATE USER usEr IDENTIFIED BY 'user'",
-            "GRANT DATABASE db1 TO user",
-            "GRANT DATABASE db2 TO user",
-            "CREATE USER useR2 IDENTIFIED BY 'user'",
-            "GRANT DATABASE db2 TO user2",
-            "REVOKE DATABASE memgraph FROM user2",
-            "SET MAIN DATABASE db2 FOR user2",
-            "CREATE USER user3 IDENTIFIED BY 'user'",
-            "GRANT ALL PRIVILEGES TO user3",
-            "GRANT DATABASE * TO user3",
-            "REVOKE DATABASE memgraph FROM user3",
-        ]
+    # Run the test with the relevant combinations of permissions
+    log(
+        "\033[1;36m~~ Starting query test ({} checks for {} combinations of permissions) ~~\033[0m".format(
+            len(test_steps), NUM_MASKS
+        ),
+        flush=True,
     )
-
-    # Find all existing permissions
-    permissions = set()
-    for query, perms in QUERIES:
-        permissions.update(perms)
-    permissions = list(sorted(permissions))
-
-    # Run the test with all combinations of permissions
-    print("\033[1;36m~~ Starting query test ~~\033[0m")
     for db in ["memgraph", "db1"]:
-        print("\033[1;36m~~ Running against db {} ~~\033[0m".format(db))
-        execute_user_queries(["USE DATABASE {}".format(db)], should_fail=True, failure_message=UNAUTHORIZED_ERROR)
+        log("\033[1;36m~~ Running against db {} ~~\033[0m".format(db), flush=True)
+        execute_user_queries([("USE DATABASE {}".format(db), EXPECT_FAILURE)])
         execute_admin_queries(["GRANT MULTI_DATABASE_USE TO User"])
-        execute_user_queries(["USE DATABASE {}".format(db)], check_failure=False, failure_message=UNAUTHORIZED_ERROR)
-        for mask in range(0, 2 ** len(permissions)):
-            user_perms = get_permissions(permissions, mask)
-            print("\033[1;34m~~ Checking queries with privileges: ", ", ".join(user_perms), " ~~\033[0m")
-            admin_queries = ["REVOKE ALL PRIVILEGES FROM uSer"]
-            if len(user_perms) > 0:
-                admin_queries.append("GRANT {} TO User".format(", ".join(user_perms)))
-            execute_admin_queries(admin_queries)
-            authorized, unauthorized = [], []
-            for query, query_perms in QUERIES:
-                if check_permissions(query_perms, user_perms):
-                    authorized.append(query)
-                else:
-                    unauthorized.append(query)
-            execute_user_queries(authorized, check_failure=False, failure_message=UNAUTHORIZED_ERROR)
-            execute_user_queries(unauthorized, should_fail=True, failure_message=UNAUTHORIZED_ERROR)
-    print("\033[1;36m~~ Finished query test ~~\033[0m\n")
+        execute_user_queries([("USE DATABASE {}".format(db), EXPECT_UNCHECKED)])
+        execute_steps("user", test_steps)
+    log("\033[1;36m~~ Finished query test ~~\033[0m\n", flush=True)
 
     # Run the user/role permissions test
-    print("\033[1;36m~~ Starting permissions test ~~\033[0m")
+    log("\033[1;36m~~ Starting permissions test ~~\033[0m", flush=True)
     execute_admin_queries(
         [
             "CREATE ROLE roLe",
             "REVOKE ALL PRIVILEGES FROM uSeR",
         ]
     )
-    execute_checker(checker_binary, [])
+    execute_checker(checker, [])
     for db in ["memgraph", "db1"]:
-        print("\033[1;36m~~ Running against db {} ~~\033[0m".format(db))
-        execute_user_queries(["USE DATABASE {}".format(db)], should_fail=True, failure_message=UNAUTHORIZED_ERROR)
+        log("\033[1;36m~~ Running against db {} ~~\033[0m".format(db), flush=True)
+        execute_user_queries([("USE DATABASE {}".format(db), EXPECT_FAILURE)])
         execute_admin_queries(["GRANT MULTI_DATABASE_USE TO User"])
-        execute_user_queries(["USE DATABASE {}".format(db)], check_failure=False, failure_message=UNAUTHORIZED_ERROR)
+        execute_user_queries([("USE DATABASE {}".format(db), EXPECT_UNCHECKED)])
         execute_admin_queries(["REVOKE MULTI_DATABASE_USE FROM User"])
-        for user_perm in ["GRANT", "DENY", "REVOKE"]:
-            for role_perm in ["GRANT", "DENY", "REVOKE"]:
-                for mapped in [True, False]:
-                    print(
-                        "\033[1;34m~~ Checking permissions with user ",
-                        user_perm,
-                        ", role ",
-                        role_perm,
-                        "user mapped to role:",
-                        mapped,
-                        " ~~\033[0m",
-                    )
-                    if mapped:
-                        execute_admin_queries(["SET ROLE FOR USER TO roLE"])
-                    else:
-                        execute_admin_queries(["CLEAR ROLE FOR user"])
-                    user_prep = "FROM" if user_perm == "REVOKE" else "TO"
-                    role_prep = "FROM" if role_perm == "REVOKE" else "TO"
-                    execute_admin_queries(
-                        [
-                            "{} MATCH {} user".format(user_perm, user_prep),
-                            "{} MATCH {} rOLe".format(role_perm, role_prep),
-                        ]
-                    )
-                    expected = []
-                    perms = [user_perm, role_perm] if mapped else [user_perm]
-                    if "DENY" in perms:
-                        expected = ["MATCH", "DENY"]
-                    elif "GRANT" in perms:
-                        expected = ["MATCH", "GRANT"]
-                    if len(expected) > 0:
-                        details = []
-                        if user_perm == "GRANT":
-                            details.append("GRANTED TO USER")
-                        elif user_perm == "DENY":
-                            details.append("DENIED TO USER")
-                        if mapped:
-                            if role_perm == "GRANT":
-                                details.append("GRANTED TO ROLE")
-                            elif role_perm == "DENY":
-                                details.append("DENIED TO ROLE")
-                        expected.append(", ".join(details))
-                    execute_checker(checker_binary, expected)
-    print("\033[1;36m~~ Finished permissions test ~~\033[0m\n")
+        for (user_perm, role_perm, mapped), expected in EXPECTED_TABLE.items():
+            log(
+                "\033[1;34m~~ Checking permissions with user ",
+                user_perm,
+                ", role ",
+                role_perm,
+                "user mapped to role:",
+                mapped,
+                " ~~\033[0m",
+            )
+            user_prep = "FROM" if user_perm == "REVOKE" else "TO"
+            role_prep = "FROM" if role_perm == "REVOKE" else "TO"
+            execute_admin_queries(
+                [
+                    "SET ROLE FOR USER TO roLE" if mapped else "CLEAR ROLE FOR user",
+                    "{} MATCH {} user".format(user_perm, user_prep),
+                    "{} MATCH {} rOLe".format(role_perm, role_prep),
+                ]
+            )
+            execute_checker(checker, expected)
+    log("\033[1;36m~~ Finished permissions test ~~\033[0m\n", flush=True)
 
     # Check database access
     # user has access to every db (with global privileges) <- tested above
     # user2 has access only to db2 (and it set to default)
     # user3 has access only to db2, but the default db is set to default (shouldn't even connect)
-    print("\033[1;36m~~ Checking privileges with custom default db ~~\033[0m\n")
-    for mask in range(0, 2 ** len(permissions)):
-        user_perms = get_permissions(permissions, mask)
-        print("\033[1;34m~~ Checking queries with privileges: ", ", ".join(user_perms), " ~~\033[0m")
-        admin_queries = ["REVOKE ALL PRIVILEGES FROM uSer2"]
-        if len(user_perms) > 0:
-            admin_queries.append("GRANT {} TO User2".format(", ".join(user_perms)))
-        execute_admin_queries(admin_queries)
-        authorized, unauthorized = [], []
-        for query, query_perms in QUERIES:
-            if check_permissions(query_perms, user_perms):
-                authorized.append(query)
-            else:
-                unauthorized.append(query)
-        execute_user_queries(authorized, check_failure=False, failure_message=UNAUTHORIZED_ERROR, username="user2")
-        execute_user_queries(unauthorized, should_fail=True, failure_message=UNAUTHORIZED_ERROR, username="user2")
-    print("\033[1;36m~~ Finished custom default db checks ~~\033[0m\n")
-
-    print("\033[1;36m~~ Checking connections and database switching ~~\033[0m\n")
+    log("\033[1;36m~~ Checking privileges with custom default db ~~\033[0m\n", flush=True)
+    execute_steps("user2", test_steps)
+    log("\033[1;36m~~ Finished custom default db checks ~~\033[0m\n", flush=True)
+
+    log("\033[1;36m~~ Checking connections and database switching ~~\033[0m\n", flush=True)
     for db in ["memgraph", "db1"]:
-        print("\033[1;36m~~ Running against db {} ~~\033[0m".format(db))
+        log("\033[1;36m~~ Running against db {} ~~\033[0m".format(db), flush=True)
         execute_admin_queries(["GRANT {} TO User2".format("MULTI_DATABASE_USE")])
-        execute_user_queries(
-            ["USE DATABASE {}".format(db)], should_fail=True, failure_message=UNAUTHORIZED_ERROR, username="user2"
-        )
-    print("\033[1;36m~~ Running with user3 (shouldn't even connect) ~~\033[0m")
+        execute_user_queries([("USE DATABASE {}".format(db), EXPECT_FAILURE)], username="user2")
+    log("\033[1;36m~~ Running with user3 (shouldn't even connect) ~~\033[0m", flush=True)
     execute_admin_queries(["GRANT {} TO User3".format("MULTI_DATABASE_USE")])
     execute_user_queries(
-        ["USE DATABASE db2"],
-        connection_should_fail=True,
+        [("USE DATABASE db2", EXPECT_SUCCESS)],
         failure_message="Couldn't communicate with the server!",
         username="user3",
+        connection_should_fail=True,
     )
-    print("\033[1;36m~~ Finished checking connections and database switching ~~\033[0m\n")
+    log("\033[1;36m~~ Finished checking connections and database switching ~~\033[0m\n", flush=True)
 
-    # Shutdown the memgraph binary
-    memgraph.terminate()
-    assert memgraph.wait() == 0, "Memgraph process didn't exit cleanly!"
+    # Shutdown the tester and checker servers
+    for tester in testers:
+        assert stop_server(tester) == 0, "Tester process didn't exit cleanly!"
+    assert stop_server(checker) == 0, "Checker process didn't exit cleanly!"
+
+    # Shutdown the memgraph binaries
+    for memgraph in memgraphs:
+        memgraph.terminate()
+    for memgraph in memgraphs:
+        assert memgraph.wait() == 0, "Memgraph process didn't exit cleanly!"
+
+
+def find_binary(*path, build_dirs=("build", "build_debug")):
+    # Returns the binary from the first build directory that contains it,
+    # falls back to the first build directory so that the error is reported
+    # only if the binary isn't given explicitly
+    for build_dir in build_dirs:
+        binary = os.path.join(PROJECT_DIR, build_dir, *path)
+        if os.path.exists(binary):
+            return binary
+    return os.path.join(PROJECT_DIR, build_dirs[0], *path)
 
 
 if __name__ == "__main__":
-    memgraph_binary = os.path.join(PROJECT_DIR, "build", "memgraph")
-    tester_binary = os.path.join(PROJECT_DIR, "build", "tests", "integration", "auth", "tester")
-    checker_binary = os.path.join(PROJECT_DIR, "build", "tests", "integration", "auth", "checker")
+    memgraph_binary = find_binary("memgraph")
+    tester_binary = find_binary("tests", "integration", "auth", "tester")
+    checker_binary = find_binary("tests", "integration", "auth", "checker")
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--memgraph", default=memgraph_binary)
     parser.add_argument("--tester", default=tester_binary)
     parser.add_argument("--checker", default=checker_binary)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of memgraph instances the query checks are split between, each one of them has to be started "
+        "and set up, so more workers only pay off for the larger coverage modes",
+    )
+    parser.add_argument(
+        "--coverage",
+        choices=["groups", "pairwise", "exhaustive"],
+        default="groups",
+        help="groups: check each group of queries requiring the same permissions with exactly those permissions "
+        "and with each one of them missing; pairwise: check all queries with masks covering each pair of "
+        "permissions in all combinations; exhaustive: check all queries with all combinations of permissions",
+    )
     args = parser.parse_args()
 
-    execute_test(args.memgraph, args.tester, args.checker)
+    try:
+        execute_test(args.memgraph, args.tester, args.checker, args.workers, args.coverage)
+    finally:
+        flush_log()
 
     sys.exit(0)
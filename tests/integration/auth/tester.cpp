@@ -9,13 +9,20 @@
 // by the Apache License, Version 2.0, included in the file
 // licenses/APL.txt.
 
+#include <iostream>
+#include <iterator>
 #include <regex>
+#include <string>
 
+#include <fmt/core.h>
 #include <gflags/gflags.h>
 
+#include <json/json.hpp>
+
 #include "communication/bolt/client.hpp"
 #include "io/network/endpoint.hpp"
 #include "io/network/utils.hpp"
+#include "utils/logging.hpp"
 
 DEFINE_string(address, "127.0.0.1", "Server address");
 DEFINE_int32(port, 7687, "Server port");
@@ -23,84 +30,143 @@ DEFINE_string(username, "", "Username for the database");
 DEFINE_string(password, "", "Password for the database");
 DEFINE_bool(use_ssl, false, "Set to true to connect with SSL to the server.");
 
-DEFINE_bool(check_failure, false, "Set to true to enable failure checking.");
-DEFINE_bool(should_fail, false, "Set to true to expect a failure.");
-DEFINE_bool(connection_should_fail, false, "Set to true to expect a connection failure.");
-DEFINE_string(failure_message, "", "Set to the expected failure message.");
+DEFINE_bool(server, false,
+            "Set to true to keep reading specs (one per line) from stdin and writing their results (one per line) to "
+            "stdout instead of executing a single spec.");
+DEFINE_bool(ping, false, "Set to true to only check that connecting to the server succeeds instead of reading a spec.");
+
+namespace {
 
 /**
- * Executes queries passed as positional arguments and verifies whether they
- * succeeded, failed, failed with a specific error message or executed without a
- * specific error occurring.
+ * Executes queries given in the spec and verifies whether each of them
+ * succeeded, failed with a specific error message or executed without a
+ * specific error occurring. The spec has the following format:
+ *
+ * {
+ *   "username": "<username>",
+ *   "password": "<password>",
+ *   "failure_message": "<regex>",
+ *   "connection_should_fail": false,
+ *   "queries": [{"query": "<query>", "expect": "success|failure|unchecked"}]
+ * }
+ *
+ * A query expecting "success" mustn't fail, a query expecting "failure" must
+ * fail with the failure message and an "unchecked" query may either succeed or
+ * fail with an error message that isn't the failure message. The username and
+ * the password default to the values of their flags. A spec without queries
+ * only checks that connecting (including the Bolt handshake) succeeds, which
+ * is used to wait for the server to start.
+ *
+ * Returns a description of the first unmet expectation or an empty string if
+ * all of them were met.
  */
-int main(int argc, char **argv) {
-  gflags::ParseCommandLineFlags(&argc, &argv, true);
-
-  memgraph::communication::SSLInit sslInit;
+std::string ExecuteSpec(memgraph::communication::ClientContext &context, const nlohmann::json &spec) {
+  const auto username = spec.value("username", FLAGS_username);
+  const auto password = spec.value("password", FLAGS_password);
+  const auto failure_message = spec.value("failure_message", "");
+  const auto connection_should_fail = spec.value("connection_should_fail", false);
 
   memgraph::io::network::Endpoint endpoint(memgraph::io::network::ResolveHostname(FLAGS_address), FLAGS_port);
 
-  memgraph::communication::ClientContext context(FLAGS_use_ssl);
   memgraph::communication::bolt::Client client(context);
 
-  std::regex re(FLAGS_failure_message);
+  std::regex re(failure_message);
 
   try {
-    client.Connect(endpoint, FLAGS_username, FLAGS_password);
+    client.Connect(endpoint, username, password);
   } catch (const memgraph::communication::bolt::ClientFatalException &e) {
-    if (FLAGS_connection_should_fail) {
-      if (!FLAGS_failure_message.empty() && !std::regex_match(e.what(), re)) {
-        LOG_FATAL(
+    if (connection_should_fail) {
+      if (!failure_message.empty() && !std::regex_match(e.what(), re)) {
+        return fmt::format(
             "The connection should have failed with an error message of '{}'' but "
             "instead it failed with '{}'",
-            FLAGS_failure_message, e.what());
+            failure_message, e.what());
       }
-      return 0;
-    } else {
-      LOG_FATAL(
-          "The connection shoudn't have failed but it failed with an "
-          "error message '{}'",
-          e.what());
+      return "";
     }
+    return fmt::format(
+        "The connection shoudn't have failed but it failed with an "
+        "error message '{}'",
+        e.what());
   }
 
-  for (int i = 1; i < argc; ++i) {
-    std::string query(argv[i]);
+  for (const auto &entry : spec.value("queries", nlohmann::json::array())) {
+    const auto query = entry.at("query").get<std::string>();
+    const auto expect = entry.at("expect").get<std::string>();
+    if (expect != "success" && expect != "failure" && expect != "unchecked") {
+      return fmt::format("Unknown expectation '{}' for the query '{}'", expect, query);
+    }
     try {
       client.Execute(query, {});
     } catch (const memgraph::communication::bolt::ClientQueryException &e) {
-      if (!FLAGS_check_failure) {
-        if (!FLAGS_failure_message.empty() && std::regex_match(e.what(), re)) {
-          LOG_FATAL(
-              "The query should have succeeded or failed with an error "
+      if (expect == "unchecked") {
+        if (!failure_message.empty() && std::regex_match(e.what(), re)) {
+          return fmt::format(
+              "The query '{}' should have succeeded or failed with an error "
               "message that isn't equal to '{}' but it failed with that error "
               "message",
-              FLAGS_failure_message);
+              query, failure_message);
         }
         continue;
       }
-      if (FLAGS_should_fail) {
-        if (!FLAGS_failure_message.empty() && !std::regex_match(e.what(), re)) {
-          LOG_FATAL(
-              "The query should have failed with an error message of '{}'' but "
+      if (expect == "failure") {
+        if (!failure_message.empty() && !std::regex_match(e.what(), re)) {
+          return fmt::format(
+              "The query '{}' should have failed with an error message of '{}'' but "
               "instead it failed with '{}'",
-              FLAGS_failure_message, e.what());
+              query, failure_message, e.what());
         }
-        return 0;
-      } else {
-        LOG_FATAL(
-            "The query shoudn't have failed but it failed with an "
-            "error message '{}'",
-            e.what());
+        continue;
       }
+      return fmt::format(
+          "The query '{}' shoudn't have failed but it failed with an "
+          "error message '{}'",
+          query, e.what());
     }
-    if (!FLAGS_check_failure) continue;
-    if (FLAGS_should_fail) {
-      LOG_FATAL(
-          "The query should have failed but instead it executed "
-          "successfully!");
+    if (expect == "failure") {
+      return fmt::format(
+          "The query '{}' should have failed but instead it executed "
+          "successfully!",
+          query);
     }
   }
 
+  return "";
+}
+
+}  // namespace
+
+/**
+ * Executes the spec read from stdin (see `ExecuteSpec`). In server mode, keeps
+ * executing specs until stdin is closed and answers each of them with a line
+ * containing `{"error": "<description of the first unmet expectation>"}`.
+ */
+int main(int argc, char **argv) {
+  gflags::ParseCommandLineFlags(&argc, &argv, true);
+
+  memgraph::communication::SSLInit sslInit;
+
+  memgraph::communication::ClientContext context(FLAGS_use_ssl);
+
+  if (!FLAGS_server) {
+    const auto spec =
+        FLAGS_ping ? nlohmann::json::object()
+                   : nlohmann::json::parse(std::istreambuf_iterator<char>(std::cin), std::istreambuf_iterator<char>());
+    const auto error = ExecuteSpec(context, spec);
+    if (!error.empty()) {
+      LOG_FATAL("{}", error);
+    }
+    return 0;
+  }
+
+  // stdout is used for the results
+  memgraph::logging::RedirectToStderr();
+
+  std::string line;
+  while (std::getline(std::cin, line)) {
+    const nlohmann::json result = {{"error", ExecuteSpec(context, nlohmann::json::parse(line))}};
+    std::cout << result.dump() << std::endl;
+  }
+
   return 0;
 }